@@ -38,14 +38,49 @@ You should have received a copy of the GNU General Public License
 along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 
 '''
+import importlib
+
 from . import _config
 
-# Need to set up all the path information
-EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, EXOTRANSMIT_INSTANCE_PATHS, EXOTRANSMIT_INPUT_PATHS = _config._configure_exotransmit_cluster()
+# The path information, and the submodules which depend on it, are only set up
+# when they are first used. See __getattr__.
+_CONFIG_NAMES = ('EXOTRANSMIT_URL', 'EXOTRANSMIT_ORIGINAL_PATH',
+                 'EXOTRANSMIT_CLUSTER_PATH', 'EXOTRANSMIT_SPECTRA_PATH',
+                 'EXOTRANSMIT_INSTANCE_PATHS', 'EXOTRANSMIT_INPUT_PATHS')
+
+
+def _lazy_config():
+    '''
+    Sets up all the path information and stores it in the module namespace, so
+    that this is only done once.
+    '''
+    config_paths = _config._configure_exotransmit_cluster()
+    globals().update(zip(_CONFIG_NAMES, config_paths))
+
+
+def __getattr__(name):
+    '''
+    Sets up path information and imports the io and core modules on first
+    access, rather than on import of exotransmit.
+    '''
+    if name in _CONFIG_NAMES:
+        _lazy_config()
+        return globals()[name]
+
+    if name in ('io', 'core'):
+        return importlib.import_module('.' + name, __name__)
+
+    if name == 'run':
+        from .core import run
+        globals()['run'] = run
+        return run
+
+    if name == 'list_eos':
+        from .io.eos import list_eos
+        globals()['list_eos'] = list_eos
+        return list_eos
 
-from . import io
-from .io import list_eos
-from .core import run
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 # Metadata
 __version__ = '1.1.0'
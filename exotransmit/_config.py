@@ -23,9 +23,9 @@ along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
 import multiprocessing as mp
-import errno
 import shutil
 import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Makes the path to config.txt, which MUST be in the same directory as this file
 PATH_TO_ORIGINAL_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'include/__config_original.txt')
@@ -54,6 +54,10 @@ def _read_config_data():
         Path to folder where spectra will be saved by default
     SETUP_COMPLETED : bool
         Flag to show if the setup of Exo-Transmit has been completed.
+    N_INSTANCES : int or None
+        Number of copies of Exo-Transmit made in the cluster during setup.
+        None if this is not known, e.g. for config files written by older
+        versions.
     '''
     if os.path.exists(PATH_TO_CONFIG_FILE):
         path_to_config = PATH_TO_CONFIG_FILE
@@ -78,7 +82,12 @@ def _read_config_data():
     else:
         raise Exception('ERROR: SETUP_COMPLETED value corrupted.')
 
-    return EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, SETUP_COMPLETED
+    if len(config_file_lines) > 15 and config_file_lines[15].isdigit():
+        N_INSTANCES = int(config_file_lines[15])
+    else:
+        N_INSTANCES = None
+
+    return EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, SETUP_COMPLETED, N_INSTANCES
 
 
 def _configure_exotransmit_cluster(reconfigure=False):
@@ -123,27 +132,23 @@ def _configure_exotransmit_cluster(reconfigure=False):
         if not confirm:
             return
 
-    EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, SETUP_COMPLETED = _read_config_data()
+    EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, SETUP_COMPLETED, N_INSTANCES = _read_config_data()
 
     if not SETUP_COMPLETED:
 
-        # Create a user version of the blank config file which we can then edit
-        shutil.copy(PATH_TO_ORIGINAL_CONFIG_FILE, PATH_TO_CONFIG_FILE)
+        # Start from the blank config file. All edits are made to this list
+        # in memory and written out to the user config file in one go once
+        # setup has completed.
+        with open(PATH_TO_ORIGINAL_CONFIG_FILE, 'r') as f:
+            config_file_lines = f.readlines()
 
-        # Ask for path to existing original Exo-Transmit and then write this
-        # to file
+        # Ask for path to existing original Exo-Transmit
         while not os.path.exists(EXOTRANSMIT_ORIGINAL_PATH):
             EXOTRANSMIT_ORIGINAL_PATH = os.path.expanduser(input('Please give the path to the compiled copy of Exo-Transmit: '))
             print(EXOTRANSMIT_ORIGINAL_PATH)
 
-        with open(PATH_TO_CONFIG_FILE, 'r') as f:
-            config_file_lines = f.readlines()
-
         config_file_lines[7] = EXOTRANSMIT_ORIGINAL_PATH + '\n'
 
-        with open(PATH_TO_CONFIG_FILE, 'w') as f:
-            f.writelines(config_file_lines)
-
         # Now make the cluster and spectra folders!
 
         try:
@@ -161,51 +166,32 @@ def _configure_exotransmit_cluster(reconfigure=False):
                 # Update config.txt with this new path
                 EXOTRANSMIT_CLUSTER_PATH = os.path.join(EXOTRANSMIT_ORIGINAL_DIR, 'ExoTransmitCluster/{}'.format(socket.gethostname()))
 
-                with open(PATH_TO_CONFIG_FILE, 'r') as f:
-                    config_file_lines = f.readlines()
-
                 config_file_lines[9] = EXOTRANSMIT_CLUSTER_PATH + '\n'
 
-                with open(PATH_TO_CONFIG_FILE, 'w') as f:
-                    f.writelines(config_file_lines)
-
             if not os.path.exists(EXOTRANSMIT_CLUSTER_PATH):
 
                 # Exo-Transmit cluster does not exist - make it!
                 print('Creating Exo-Transmit cluster at {}'.format(EXOTRANSMIT_CLUSTER_PATH))
 
                 # Create the ExoTransmitCluster directory
-                try:
-                    os.makedirs(EXOTRANSMIT_CLUSTER_PATH)
-                except OSError as exception:
-                    if exception.errno != errno.EEXIST:
-                        raise
-
-                # Create the copies of Exo-Transmit in the new cluster directory
-                for i in range(n_cores):
-                    try:
-                        print('Creating Exo-Transmit copy {} of {}'.format(i+1, n_cores))
-
-                        # Make the path name
-                        exotransmit_copy_path = os.path.join(EXOTRANSMIT_CLUSTER_PATH, 'ExoTransmit{}'.format(i+1))
-
-                        # Copy Exo-Transmit into this new directory
-                        shutil.copytree(EXOTRANSMIT_ORIGINAL_PATH, exotransmit_copy_path)
-
-                        # Change home directory path in the new userInput file.
-                        with open(exotransmit_copy_path + '/userInput.in', 'r') as f:
-                            userIn = f.readlines()
-                        userIn[3] = exotransmit_copy_path + '\n'
-                        with open(exotransmit_copy_path + '/userInput.in', 'w') as f:
-                            f.writelines(userIn)
-
-                    except FileExistsError as exception:
-                        if exception.errno != errno.EEXIST:
-                            raise
-
-                    # TODO: should probably check to see if there is anything
-                    # already in the Spectra folder of each copy and delete
-                    # so as not to clog it all up!
+                os.makedirs(EXOTRANSMIT_CLUSTER_PATH, exist_ok=True)
+
+                # Create the copies of Exo-Transmit in the new cluster
+                # directory. The copies are independent of each other, so are
+                # made concurrently.
+                with ThreadPoolExecutor(max_workers=n_cores) as executor:
+                    copies = [executor.submit(_provision_instance, i, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH) for i in range(n_cores)]
+
+                    for n_done, copy in enumerate(as_completed(copies)):
+                        copy.result()
+                        print('Created Exo-Transmit copy {} of {}'.format(n_done+1, n_cores))
+
+                N_INSTANCES = n_cores
+                config_file_lines[15] = str(N_INSTANCES) + '\n'
+
+                # TODO: should probably check to see if there is anything
+                # already in the Spectra folder of each copy and delete
+                # so as not to clog it all up!
 
             #####################################
             # EXOTRANSMIT SPECTRUM FOLDER SETUP #
@@ -216,14 +202,8 @@ def _configure_exotransmit_cluster(reconfigure=False):
                 # Update config.txt with this new path
                 EXOTRANSMIT_SPECTRA_PATH = os.path.join(EXOTRANSMIT_ORIGINAL_DIR, 'ExoTransmitSpectra')
 
-                with open(PATH_TO_CONFIG_FILE, 'r') as f:
-                    config_file_lines = f.readlines()
-
                 config_file_lines[11] = EXOTRANSMIT_SPECTRA_PATH + '\n'
 
-                with open(PATH_TO_CONFIG_FILE, 'w') as f:
-                    f.writelines(config_file_lines)
-
             else:
                 # Path is specified in config.txt
                 EXOTRANSMIT_SPECTRA_PATH = os.path.join(EXOTRANSMIT_SPECTRA_PATH, 'ExoTransmitSpectra')
@@ -233,16 +213,10 @@ def _configure_exotransmit_cluster(reconfigure=False):
                 print('Exo-Transmit spectra folder does not exist. Creating at path {}'.format(EXOTRANSMIT_SPECTRA_PATH))
 
                 # Create the ExoTransmitSpectra directory
-                try:
-                    os.makedirs(EXOTRANSMIT_SPECTRA_PATH)
-                except OSError as exception:
-                    if exception.errno != errno.EEXIST:
-                        raise
-
-            # Update SETUP_COMPLETED to reflect completed setup
-            with open(PATH_TO_CONFIG_FILE, 'r') as f:
-                config_file_lines = f.readlines()
+                os.makedirs(EXOTRANSMIT_SPECTRA_PATH, exist_ok=True)
 
+            # Update SETUP_COMPLETED to reflect completed setup and write
+            # the config file
             config_file_lines[13] = 'True\n'
 
             with open(PATH_TO_CONFIG_FILE, 'w') as f:
@@ -250,25 +224,76 @@ def _configure_exotransmit_cluster(reconfigure=False):
         except:
             raise
 
-    # Find the paths to the copies of Exo-Transmit within the cluster
-    # so we can call them later when we need to.
-    EXOTRANSMIT_INSTANCE_PATHS = [os.path.join(EXOTRANSMIT_CLUSTER_PATH, instance) for instance in next(os.walk(EXOTRANSMIT_CLUSTER_PATH))[1]]
+    # Find the paths to the copies of Exo-Transmit within the cluster, and to
+    # the userInput.in for each copy, so we can call them later when we need
+    # to. If we know how many copies were made, the paths follow from their
+    # names. Otherwise, look in the cluster directory.
+    EXOTRANSMIT_INSTANCE_PATHS = None
+    if N_INSTANCES is not None:
+        EXOTRANSMIT_INSTANCE_PATHS = [os.path.join(EXOTRANSMIT_CLUSTER_PATH, 'ExoTransmit{}'.format(i+1)) for i in range(N_INSTANCES)]
+        if not all(os.path.isdir(path) for path in EXOTRANSMIT_INSTANCE_PATHS):
+            EXOTRANSMIT_INSTANCE_PATHS = None
+
+    if EXOTRANSMIT_INSTANCE_PATHS is None:
+        with os.scandir(EXOTRANSMIT_CLUSTER_PATH) as cluster_entries:
+            EXOTRANSMIT_INSTANCE_PATHS = [entry.path for entry in cluster_entries if entry.is_dir(follow_symlinks=False)]
 
-    # Find the paths to the userInput.in for each copy of Exo-Transmit
     EXOTRANSMIT_INPUT_PATHS = [ET + '/userInput.in' for ET in EXOTRANSMIT_INSTANCE_PATHS]
 
     return EXOTRANSMIT_URL, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH, EXOTRANSMIT_SPECTRA_PATH, EXOTRANSMIT_INSTANCE_PATHS, EXOTRANSMIT_INPUT_PATHS
 
 
+def _provision_instance(i, EXOTRANSMIT_ORIGINAL_PATH, EXOTRANSMIT_CLUSTER_PATH):
+    '''
+    Creates copy i of Exo-Transmit within the cluster, and points the
+    userInput.in of the copy at its own directory.
+
+    Parameters
+    ----------
+    i : int
+        Index of the copy. The copy will be called ExoTransmit{i+1}
+    EXOTRANSMIT_ORIGINAL_PATH : str
+        The path to downloaded copy of Exo-Transmit
+    EXOTRANSMIT_CLUSTER_PATH : str
+        Path to parent folder of the Exo-Transmit cluster
+
+    Returns
+    -------
+    exotransmit_copy_path : str
+        Path to the new copy of Exo-Transmit
+    '''
+    # Make the path name
+    exotransmit_copy_path = os.path.join(EXOTRANSMIT_CLUSTER_PATH, 'ExoTransmit{}'.format(i+1))
+
+    # Copy Exo-Transmit into this new directory
+    shutil.copytree(EXOTRANSMIT_ORIGINAL_PATH, exotransmit_copy_path,
+                    copy_function=shutil.copy, dirs_exist_ok=True)
+
+    # Change home directory path in the new userInput file.
+    with open(exotransmit_copy_path + '/userInput.in', 'r') as f:
+        userIn = f.readlines()
+    userIn[3] = exotransmit_copy_path + '\n'
+    with open(exotransmit_copy_path + '/userInput.in', 'w') as f:
+        f.writelines(userIn)
+
+    return exotransmit_copy_path
+
+
 def _reset_exotransmit():
     '''
     This will reset the
 
     '''
-    with open(PATH_TO_CONFIG_FILE, 'r') as f:
+    # The config file is only written once setup has completed, so if setup
+    # was interrupted there is nothing to reset but the original.
+    if os.path.exists(PATH_TO_CONFIG_FILE):
+        path_to_config = PATH_TO_CONFIG_FILE
+    else:
+        path_to_config = PATH_TO_ORIGINAL_CONFIG_FILE
+
+    with open(path_to_config, 'r') as f:
         config_file_lines = f.readlines()
-    with open(PATH_TO_CONFIG_FILE, 'r') as f:
-        stripped_lines = [line.strip() for line in f.readlines()]
+    stripped_lines = [line.strip() for line in config_file_lines]
 
     original_cluster_location = os.path.expanduser(stripped_lines[9])
     original_spectra_location = os.path.expanduser(stripped_lines[11])
@@ -305,6 +330,8 @@ def _reset_exotransmit():
     config_file_lines[9] = '\n'
     config_file_lines[11] = '\n'
     config_file_lines[13] = 'False\n'
+    if len(config_file_lines) > 15:
+        config_file_lines[15] = '\n'
     with open(PATH_TO_CONFIG_FILE, 'w') as f:
         f.writelines(config_file_lines)
 
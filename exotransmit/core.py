@@ -28,10 +28,26 @@ import shutil
 import subprocess
 import numpy as np
 import multiprocessing as mp
-from copy import deepcopy
 
+# Number of cores available on this machine
+_NCPU = mp.cpu_count()
 
-def run(planet_parameters, output_path=None, clobber=False, ncores=mp.cpu_count(),
+# Buffer and block size used when rewriting spectrum files (1 MiB)
+_COPY_BUFFER_SIZE = 1 << 20
+
+# Folder each instance of ExoTransmit saves its spectra to
+_INSTANCE_SPECTRA_DIRS = [path + '/Spectra/' for path in EXOTRANSMIT_INSTANCE_PATHS]
+
+# Persistent pool of worker processes used by run, created on first use, and
+# the number of workers in it.
+_POOL = None
+_POOL_NCORES = 0
+
+# The instance of ExoTransmit owned by the current worker process.
+_WORKER_INSTANCE = 0
+
+
+def run(planet_parameters, output_path=None, clobber=False, ncores=None,
         return_paths=False):
     """
     Runs ExoTransmit on a planet or list of planets to create spectrum files.
@@ -55,9 +71,10 @@ def run(planet_parameters, output_path=None, clobber=False, ncores=mp.cpu_count(
     ncores : int, optional
         The number of cores of the machine to make available to ExoTransmit. If
         more than one planet is supplied and more than one core is available,
-        the function will split planets evenly between the available cores to
-        reduce the overall runtime of the function. Default is the total number
-        of cores on the machine.
+        the function will share planets out between the available cores to
+        reduce the overall runtime of the function, with cores that finish
+        early taking on more planets. Default is the total number of cores on
+        the machine.
     return_paths : bool, optional
         If True, will return the paths within ExoTransmitSpectra where the
         output spectra have been saved. Default False
@@ -69,133 +86,258 @@ def run(planet_parameters, output_path=None, clobber=False, ncores=mp.cpu_count(
         if return_paths is True.
     """
 
-    # SUBPROCESS ##############################################################
-    def exotransmit_subprocess(parameter_list, output_list, n):
-        '''
-        Subprocess to chew through a list of planets using one instance of
-            ExoTransmit (denoted by n)
-        planet_list and output_list are np.ndarrays
-
-        '''
-        # set so that the user feedback on cores is presented in a
-        # readable way
-        core_n = n + 1
-
-        if parameter_list.ndim == 1:
-            # a single set of parameters has been passed. Reformat it so we can
-            # pass it to the cores!
-            parameter_list = np.array([parameter_list])
-            output_list = np.array([output_list])
-
-        # Begin the simulations!
-        print('Core {} starting {} jobs'.format(core_n, len(parameter_list)))
-
-        for i, parameters in enumerate(parameter_list):
-            # Check to see if spectrum has already been generated
-            if os.path.exists(os.path.join(EXOTRANSMIT_SPECTRA_PATH, output_list[i])) and not clobber:
-                print(
-                    'Data for this planet already exists!\n'
-                    'Please use clobber=True to overwrite.\n{}'.format(parameters))
-            else:
-                _exotransmit_direct_run(parameters, output_list[i], n)
+    if ncores is None:
+        ncores = _NCPU
 
-            print('Core {}: {}/{} jobs completed'.format(core_n,
-                                                         i + 1, len(parameter_list)))
+    if ncores > _NCPU:
+        raise Exception('ncores={} was specified, but this machine only has {} cores!'.format(
+            ncores, _NCPU))
 
-    ###########################################################################
-    # MAIN FUNCTION ###########################################################
+    # FOR SINGLE PLANET #######################################################
 
-    if ncores > mp.cpu_count():
-        raise Exception('ncores={} was specified, but this machine only has {} cores!'.format(
-            ncores, mp.cpu_count()))
+    # A single planet is run directly, without building any arrays.
+    if len(planet_parameters) > 0 and not hasattr(planet_parameters[0], '__len__'):
+        return _run_single(list(planet_parameters), output_path, clobber,
+                           return_paths)
+
+    # FOR MULTIPLE PLANETS ####################################################
+
+    # If an integer array has been given, the EoS codes are already ints
+    eos_codes_are_int = (isinstance(planet_parameters, np.ndarray) and
+                         np.issubdtype(planet_parameters.dtype, np.integer))
 
-    # Cast planets to numpy array if necessary - by checking the number of
-    # dimensions, we can see if we have been asked to do more than one planet 
     planet_parameters = np.asarray(planet_parameters, dtype=object)
 
     # Check that the Eos codes are all ints, and change them if needed.
-    if planet_parameters.ndim == 1:
-        if planet_parameters[0] % 1 == 0:
-            if not type(planet_parameters[0]) is int:
-                planet_parameters[0] = int(planet_parameters[0])
-        else:
-            raise TypeError('Unable to safely convert input EoS {} into int value'.format(planet_parameters[0]))
-    else:
-        for params in planet_parameters:
-            if params[0] % 1 == 0:
-                if not type(params[0]) is int:
-                    params[0] = int(params[0])
+    if not eos_codes_are_int:
+        # Check all of the codes at once rather than planet by planet
+        eos_codes = np.fromiter((params[0] for params in planet_parameters),
+                                dtype=np.float64, count=len(planet_parameters))
+        fractional = np.mod(eos_codes, 1) != 0
+        if fractional.any():
+            raise TypeError('Unable to safely convert input EoS {} into int value'.format(
+                planet_parameters[np.argmax(fractional)][0]))
+
+        for params, eos_code in zip(planet_parameters, eos_codes.astype(np.int64).tolist()):
+            params[0] = eos_code
+
+    if output_path is None:
+        # Generate file names
+        output_path = [f'{io.get_eos(param_set[0])}/{int(param_set[1])}/{io.make_file_name(param_set)}'
+                       for param_set in planet_parameters]
+
+    output_path = np.asarray(output_path, dtype=object)
+
+    if not len(planet_parameters) == len(output_path):
+        raise Exception(
+            'ERROR: Number of planets and outputs do not match')
+
+    jobs = list(zip(planet_parameters, output_path))
+
+    if not clobber:
+        # Check to see which spectra have already been generated, using
+        # one scan per output folder rather than a check per planet
+        relative_paths = [_relative_spectrum_path(path) for path in output_path]
+        existing_spectra = _find_existing_spectra(relative_paths)
+        new_jobs = []
+        for (parameters, path), relative_path in zip(jobs, relative_paths):
+            if relative_path in existing_spectra:
+                print(
+                    'Data for this planet already exists!\n'
+                    'Please use clobber=True to overwrite.\n{}'.format(parameters))
             else:
-                raise TypeError('Unable to safely convert input EoS {} into int value'.format(params[0]))
+                new_jobs.append((parameters, path))
+        jobs = new_jobs
 
+    # Planets are handed out to a persistent pool of worker processes,
+    # each of which uses its own instance of ExoTransmit.
+    n_jobs = len(jobs)
+    if n_jobs > 0:
+        pool = _get_pool(ncores)
 
+        print('Running {} jobs on {} cores'.format(n_jobs, ncores))
 
-    if output_path is None:
-        # Generate file names
-        if planet_parameters.ndim == 1:
-            output_path = ['{}/{}/{}'.format(io.get_eos(planet_parameters[0]), int(
-                planet_parameters[1]), io.make_file_name(planet_parameters))]
-        else:
-            output_path = []
-            for param_set in planet_parameters:
-                output_path.append('{}/{}/{}'.format(io.get_eos(param_set[0]), int(
-                    param_set[1]), io.make_file_name(param_set)))
+        # Jobs are handed out in small chunks so that workers which finish
+        # quickly (e.g. clear atmospheres) take on the remaining work
+        # rather than waiting on the slowest worker.
+        try:
+            results = pool.imap_unordered(_run_one, jobs,
+                                          chunksize=max(1, n_jobs // (8 * ncores)))
+            for i, n in enumerate(results):
+                print('{}/{} jobs completed (core {})'.format(i + 1, n_jobs, n + 1))
+        except BaseException:
+            # Stop the workers going through the rest of the failed run's
+            # jobs, so that the next run starts with a fresh pool.
+            _terminate_pool()
+            raise
 
+    if return_paths:
+        return _full_output_paths(output_path)
 
 
-    output_path = np.asarray(output_path, dtype=object)
-    # Make the full final output paths of the spectra so we can return this.
-    full_output_path = deepcopy(output_path)
-    for i, path in enumerate(full_output_path):
-        full_output_path[i] = os.path.join(EXOTRANSMIT_SPECTRA_PATH, path)
+def _run_single(planet_parameters, output_path, clobber, return_paths):
+    '''
+    Runs ExoTransmit on a single planet in the current process. Called by run,
+    which documents the parameters.
+    '''
+    # Check that the Eos code is an int, and change it if needed.
+    if not planet_parameters[0] % 1 == 0:
+        raise TypeError('Unable to safely convert input EoS {} into int value'.format(planet_parameters[0]))
+    planet_parameters[0] = int(planet_parameters[0])
 
-    if not len(planet_parameters) == len(output_path):
-        if not planet_parameters.ndim == len(output_path):
+    if output_path is None:
+        output_path = f'{io.get_eos(planet_parameters[0])}/{int(planet_parameters[1])}/{io.make_file_name(planet_parameters)}'
+    elif not isinstance(output_path, str):
+        if not len(output_path) == 1:
             raise Exception(
                 'ERROR: Number of planets and outputs do not match')
+        output_path = output_path[0]
 
-    # FOR SINGLE PLANET #######################################################
+    if not clobber and os.path.exists(os.path.join(EXOTRANSMIT_SPECTRA_PATH,
+                                                   _relative_spectrum_path(output_path))):
+        print(
+            'Data for this planet already exists!\n'
+            'Please use clobber=True to overwrite.\n{}'.format(planet_parameters))
+    else:
+        print('Simulating planet...')
+        _exotransmit_direct_run(planet_parameters, output_path)
 
-    if planet_parameters.ndim == 1:
-        if os.path.exists(os.path.join(EXOTRANSMIT_SPECTRA_PATH, output_path[0])) and not clobber:
-            print(
-                'Data for this planet already exists!\n'
-                'Please use clobber=True to overwrite.\n{}'.format(planet_parameters))
-        else:
-            print('Simulating planet...')
-            _exotransmit_direct_run(planet_parameters, output_path.item())
+    if return_paths:
+        return _full_output_paths([output_path])
 
-    # FOR MULTIPLE PLANETS ####################################################
 
-    # N PLANETS < N CORES #####################################################
-    else:
-        if len(planet_parameters) < ncores:
-            # Not all cores are needed, so we can do this separately.
-            jobs = []
-            for n in range(len(planet_parameters)):
-                process = mp.Process(target=exotransmit_subprocess,
-                                     args=(planet_parameters[n], output_path[n], n))
-                jobs.append(process)
-                process.start()
-
-    # N PLANETS > N CORES #####################################################
-        else:
-            # Split arrays for each core
-            planet_parameters_split = np.array_split(planet_parameters, ncores)
-            output_path = np.array_split(output_path, ncores)
-
-            jobs = []
-            for n in range(ncores):
-                process = mp.Process(target=exotransmit_subprocess,
-                                     args=(planet_parameters_split[n], output_path[n], n))
-                jobs.append(process)
-                process.start()
-
-        for process in jobs:
-            process.join()
+def _full_output_paths(output_path):
+    '''
+    Makes the full final output paths of the spectra from the paths given
+    relative to EXOTRANSMIT_SPECTRA_PATH.
+    '''
+    spectra_path = EXOTRANSMIT_SPECTRA_PATH.rstrip('/')
+    return np.array(['{}/{}'.format(spectra_path, path.lstrip('/')) for path in output_path],
+                    dtype=object)
 
-    if return_paths:
-        return full_output_path
+
+def _get_pool(ncores):
+    '''
+    Gets the pool of worker processes used by run, creating it if it does not
+    exist yet or if it has a different number of workers.
+
+    Parameters
+    ----------
+    ncores : int
+        The number of worker processes needed.
+
+    Returns
+    -------
+    pool : multiprocessing.Pool
+        Pool of ncores worker processes, each of which has been assigned its
+        own instance of ExoTransmit.
+    '''
+    global _POOL, _POOL_NCORES
+
+    if _POOL is None or not _POOL_NCORES == ncores:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL.join()
+
+        # Each worker takes one instance number from the queue on start up
+        instance_queue = mp.Queue()
+        for n in range(ncores):
+            instance_queue.put(n)
+
+        _POOL = mp.Pool(ncores, initializer=_init_worker,
+                        initargs=(instance_queue,))
+        _POOL_NCORES = ncores
+
+    return _POOL
+
+
+def _terminate_pool():
+    '''
+    Stops the pool of worker processes used by run straight away, dropping
+    any jobs it has not finished. A new pool is made on the next run.
+    '''
+    global _POOL, _POOL_NCORES
+
+    if _POOL is not None:
+        _POOL.terminate()
+        _POOL.join()
+        _POOL = None
+        _POOL_NCORES = 0
+
+
+def _init_worker(instance_queue):
+    '''
+    Initialiser for the worker processes of the pool. Assigns the worker the
+    instance of ExoTransmit it will use for all of its runs, so that no two
+    workers ever share an instance.
+    '''
+    global _WORKER_INSTANCE
+
+    _WORKER_INSTANCE = instance_queue.get()
+
+
+def _run_one(job):
+    '''
+    Runs a single planet within a worker process of the pool.
+
+    Parameters
+    ----------
+    job : tuple
+        (planet_parameters, output_path) for the planet.
+
+    Returns
+    -------
+    n : int
+        The instance of ExoTransmit the job was run on.
+    '''
+    parameters, output_path = job
+
+    _exotransmit_direct_run(parameters, output_path, _WORKER_INSTANCE)
+
+    return _WORKER_INSTANCE
+
+
+def _find_existing_spectra(relative_paths):
+    '''
+    Finds which spectra have already been generated in the folders that the
+    given spectra would be saved to. Each folder is only scanned once, and
+    no other folders within ExoTransmitSpectra are looked at.
+
+    Parameters
+    ----------
+    relative_paths : list of str
+        Paths of the spectra to be generated, relative to
+        EXOTRANSMIT_SPECTRA_PATH, as returned by _relative_spectrum_path
+
+    Returns
+    -------
+    existing_spectra : frozenset of str
+        Paths of all files within the folders of relative_paths, relative to
+        EXOTRANSMIT_SPECTRA_PATH
+    '''
+    existing_spectra = []
+    for relative_dirpath in set(os.path.dirname(path) for path in relative_paths):
+        try:
+            with os.scandir(os.path.join(EXOTRANSMIT_SPECTRA_PATH, relative_dirpath)) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        existing_spectra.append(os.path.join(relative_dirpath, entry.name))
+        except FileNotFoundError:
+            # Nothing has been saved to this folder yet
+            pass
+
+    return frozenset(existing_spectra)
+
+
+def _relative_spectrum_path(output_path):
+    '''
+    Finds the path, relative to EXOTRANSMIT_SPECTRA_PATH, that a spectrum
+    given output_path will be saved to by _exotransmit_direct_run.
+    '''
+    if not output_path[-4:] == '.dat':
+        output_path += '.dat'
+
+    return os.path.normpath(output_path.lstrip('/'))
 
 
 def _exotransmit_direct_run(planet_parameters, output_path, n=0):
@@ -232,57 +374,63 @@ def _exotransmit_direct_run(planet_parameters, output_path, n=0):
         to save your spectrum to. This may change in later releases.
     n : int, optional
         Specifies the instance of ExoTransmit being used
+
+    Notes
+    -----
+    Exo-Transmit reads userInput.in and loads its opacity tables once on
+    start up, and has no mode for running several planets in one process. A
+    new Exo-Transmit process is therefore started for each planet.
     '''
 
     # Format output path appropriately
-    if not output_path[-4:] == '.dat':
+    if not output_path.endswith('.dat'):
         output_path += '.dat'
-    if not output_path[0] == '/':
-        output_path = '/' + output_path
+    if not output_path.startswith('/'):
+        output_path = f'/{output_path}'
 
     output_file_name = os.path.basename(output_path)
 
     # Set parameters for the run
-    io.set_parameters(planet_parameters[0], planet_parameters[1],
-                      planet_parameters[2], planet_parameters[3],
-                      planet_parameters[4], planet_parameters[5],
-                      planet_parameters[6], output_file_name, n)
+    parameters_list = io.set_parameters(planet_parameters[0], planet_parameters[1],
+                                        planet_parameters[2], planet_parameters[3],
+                                        planet_parameters[4], planet_parameters[5],
+                                        planet_parameters[6], output_file_name, n)
 
-    # Run ExoTransmit - need to switch into appropriate directory and back
-    # again
-    current_dir = os.getcwd()
-
-    os.chdir(EXOTRANSMIT_INSTANCE_PATHS[n])
-    subprocess.check_output(['./Exo_Transmit'])
-    os.chdir(current_dir)
+    # Run ExoTransmit - this needs to be run from within the appropriate
+    # directory, which is set for the child process only.
+    subprocess.run(['./Exo_Transmit'], cwd=EXOTRANSMIT_INSTANCE_PATHS[n],
+                   check=True, stdout=subprocess.DEVNULL)
 
     # ExoTransmit saves output spectra files within a folder in each
     # instance of ExoTransmit. To save to the specified output path, the
     # files must be moved manually, done here.
 
     desired_output_path = EXOTRANSMIT_SPECTRA_PATH + output_path
-    default_output_path = EXOTRANSMIT_INSTANCE_PATHS[n] + \
-        '/Spectra/' + output_file_name
+    default_output_path = _INSTANCE_SPECTRA_DIRS[n] + output_file_name
 
     # Create folders to save output to
-    if not os.path.exists(os.path.dirname(desired_output_path)):
-        try:
-            os.makedirs(os.path.dirname(desired_output_path))
-        except OSError as exception:
-            if exception.errno != errno.EEXIST:
-                raise
-
-    # Move the output file
-    shutil.move(default_output_path, desired_output_path)
+    os.makedirs(os.path.dirname(desired_output_path), exist_ok=True)
+
+    # Move the output file. The cluster and spectra folders are normally on
+    # the same filesystem, so this is just a rename.
+    try:
+        os.replace(default_output_path, desired_output_path)
+    except OSError as exception:
+        # The spectra folder is on a different device to the cluster
+        if exception.errno != errno.EXDEV:
+            raise
+        shutil.move(default_output_path, desired_output_path)
 
     # Prepend planet parameters to output file
-    parameters_list = io.get_parameters(n)
     details_to_prepend = 'EoS:{}, T:{}, g:{}, r_p:{}, r_s:{}, P:{}, r:{}'.format(
         os.path.basename(parameters_list[0])[
             :-4], parameters_list[1], parameters_list[3],
         parameters_list[4], parameters_list[5], parameters_list[6],
         parameters_list[7])
-    with open(desired_output_path, 'r+') as f:
-        content = f.read()
-        f.seek(0, 0)
-        f.write(details_to_prepend.rstrip('\r\n') + '\n' + content)
+    # The spectrum is streamed into a new file after the header, which then
+    # replaces the original, rather than reading the whole spectrum into memory.
+    with open(desired_output_path, 'rb', buffering=_COPY_BUFFER_SIZE) as src, \
+            open(desired_output_path + '.tmp', 'wb', buffering=_COPY_BUFFER_SIZE) as dst:
+        dst.write((details_to_prepend.rstrip('\r\n') + '\n').encode())
+        shutil.copyfileobj(src, dst, length=_COPY_BUFFER_SIZE)
+    os.replace(desired_output_path + '.tmp', desired_output_path)
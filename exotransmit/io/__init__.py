@@ -10,7 +10,7 @@ Functionality:
 - Set up initial ExoTransmit structure, based off number of available cores
 - Set parameters within userInput.in
 - Creates consistent file naming
-- Loads spectral data for a planet
+- Loads spectral data for a planet, or for many planets at once
 - Lists and fetches eos names and codes using eos_list.txt
 
 Contents
@@ -37,8 +37,38 @@ You should have received a copy of the GNU General Public License
 along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-from .eos import get_eos, list_eos, enumerate_eos, list_path
-from .filehandler import make_file_name, create_folders, load_spectral_data, get_params_from_file
-from .parameters import set_parameters, get_parameters, _check_planet_units, _check_star_units
+import importlib
 
-eos_list_path = list_path
+# The submodules are only imported when one of their names is first used, so
+# that e.g. list_eos does not need the cluster to be set up. See __getattr__.
+_SUBMODULE_NAMES = {
+    'eos': ('get_eos', 'list_eos', 'enumerate_eos', 'list_path'),
+    'filehandler': ('PlanetParams', 'make_file_name', 'create_folders',
+                    'load_spectral_data', 'load_many', 'get_params_from_file',
+                    'get_params_from_files', 'read_spectrum_file'),
+    'parameters': ('set_parameters', 'get_parameters', '_check_planet_units',
+                   '_check_star_units'),
+}
+
+_NAME_TO_SUBMODULE = {name: submodule for submodule, names in _SUBMODULE_NAMES.items()
+                      for name in names}
+
+
+def __getattr__(name):
+    '''
+    Imports the submodule which defines name on first access, rather than on
+    import of exotransmit.io.
+    '''
+    if name in _SUBMODULE_NAMES:
+        return importlib.import_module('.' + name, __name__)
+
+    if name == 'eos_list_path':
+        return __getattr__('list_path')
+
+    if name in _NAME_TO_SUBMODULE:
+        submodule = importlib.import_module('.' + _NAME_TO_SUBMODULE[name], __name__)
+        value = getattr(submodule, name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -22,9 +22,34 @@ along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 
 '''
 
-import os
+from functools import lru_cache
+from importlib.resources import files
 
-list_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'include/eos_list.txt')
+# eos_list.txt as a package resource, and its path as a str
+_LIST_RESOURCE = files('exotransmit') / 'include' / 'eos_list.txt'
+list_path = str(_LIST_RESOURCE)
+
+
+@lru_cache(maxsize=1)
+def _load_eos_list():
+    '''
+    Reads in the names of the equations of state from eos_list.txt. The file
+    is only read the first time this is called.
+
+    Returns
+    -------
+    eos_list : tuple of str
+        Names of the equation of state files, in order of their code.
+    '''
+    return tuple(_LIST_RESOURCE.read_text().splitlines())
+
+
+@lru_cache(maxsize=1)
+def _eos_index():
+    '''
+    Returns a dict of equation of state name to numerical code.
+    '''
+    return {eos: i for i, eos in enumerate(_load_eos_list())}
 
 
 def get_eos(n):
@@ -46,20 +71,22 @@ def get_eos(n):
     if not n % 1 == 0:
         raise ValueError('Code {} cannot be unambiguously converted into an integer index'.format(n))
 
-    n = int(n)
+    return _get_eos_cached(int(n))
 
-    with open(list_path, 'r') as f:
-        eos_list = [line.rstrip('\n') for line in f]
 
-    return eos_list[n]
+@lru_cache(maxsize=128)
+def _get_eos_cached(n):
+    '''
+    Cached lookup of the equation of state name for an integer code n.
+    '''
+    return _load_eos_list()[n]
 
 
 def list_eos():
     '''
     Prints available EOS with code to call them
     '''
-    with open(list_path, 'r') as f:
-        eos_list = [line.rstrip('\n') for line in f]
+    eos_list = _load_eos_list()
 
     print('Available Equations of State:')
     for i, eos in enumerate(eos_list):
@@ -81,10 +108,7 @@ def enumerate_eos(eos_name):
         Integer code needed to reference the equation of state
     '''
 
-    with open(list_path, 'r') as f:
-        eos_list = [line.rstrip('\n') for line in f]
-
     try:
-        return eos_list.index(eos_name)
-    except ValueError:
+        return _eos_index()[eos_name]
+    except KeyError:
         raise ValueError('Unrecognised EOS filename {}'.format(eos_name))
@@ -7,6 +7,7 @@ exotransmit.io.filehandler
 Module for handling files within ExoTransmit
 - Standardised file naming
 - Loading spectral data for a given planet (checks if this exists)
+- Loading spectral data for many planets at once
 
 ---------------------------------------------------------------------
 ExoTransmitPy is free software: you can redistribute it and/or modify
@@ -29,7 +30,92 @@ import os
 import numpy as np
 import astropy.constants as c
 import astropy.units as u
-import errno
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# Number of header lines in a spectrum file: the planet parameters added by
+# ExoTransmitPy, then the two lines written by Exo-Transmit
+_N_HEADER_LINES = 3
+
+# Jupiter and Solar radii in m
+_R_JUP = float(c.R_jup.value)
+_R_SUN = float(c.R_sun.value)
+
+# Fields of PlanetParams, in the order they are indexed
+_PLANET_PARAMS_FIELDS = ('eos', 'T', 'g', 'Rp', 'Rs', 'P', 'r')
+
+
+@dataclass(frozen=True)
+class PlanetParams:
+    '''
+    Parameters used to generate a spectrum. These can also be indexed,
+    unpacked and iterated over like a list in the form
+    [eos code, T, g, Rp, Rs, P, r].
+
+    Attributes
+    ----------
+    eos : int
+        Equation of state code
+    T : float
+        Equilibrium temperature in K
+    g : float
+        Surface gravity in m/s2
+    Rp : float
+        Planet radius in Jupiter radii
+    Rs : float
+        Stellar radius in Solar radii
+    P : float
+        Cloud top pressure in Pa
+    r : float
+        Rayleigh scattering factor
+    '''
+    eos: int
+    T: float
+    g: float
+    Rp: float
+    Rs: float
+    P: float
+    r: float
+
+    def __iter__(self):
+        return iter((self.eos, self.T, self.g, self.Rp, self.Rs, self.P, self.r))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple(self)[i]
+        return getattr(self, _PLANET_PARAMS_FIELDS[i])
+
+    def __len__(self):
+        return 7
+
+    @property
+    def Rp_m(self):
+        '''Planet radius in m'''
+        return self.Rp * _R_JUP
+
+    @property
+    def Rs_m(self):
+        '''Stellar radius in m'''
+        return self.Rs * _R_SUN
+
+    def to_quantities(self):
+        '''
+        Returns the parameters with the relevant astropy units attached.
+
+        Returns
+        -------
+        spectrum_parameters : tuple
+            (EOS code, T, g, Rp, Rs, P, r), with units attached to all but
+            the EOS code and rayleigh factor.
+        '''
+        return (self.eos, self.T * u.K, self.g * u.m * u.s**-2,
+                self.Rp * u.R_jup, self.Rs * u.R_sun, self.P * u.Pa, self.r)
 
 
 def make_file_name(planet_info):
@@ -64,9 +150,8 @@ def make_file_name(planet_info):
         F - Cloud top pressure in Pa
         G - Rayleigh scattering factor
     '''
-    return '{0}-{1:.1f}-{2:.2f}-{3:.2f}-{4:.2f}-{5:.2f}-{6:.2f}.dat'.format(
-        eos.get_eos(planet_info[0]), planet_info[1], planet_info[2],
-        planet_info[3], planet_info[4], planet_info[5], planet_info[6])
+    return (f'{eos.get_eos(planet_info[0])}-{planet_info[1]:.1f}-{planet_info[2]:.2f}-'
+            f'{planet_info[3]:.2f}-{planet_info[4]:.2f}-{planet_info[5]:.2f}-{planet_info[6]:.2f}.dat')
 
 
 def create_folders(full_path):
@@ -80,12 +165,7 @@ def create_folders(full_path):
         works by removing this from the string an creating the necessary
         folders from that.
     '''
-    if not os.path.exists(full_path):
-        try:
-            os.makedirs(os.path.dirname(full_path))
-        except OSError as exception:
-            if exception.errno != errno.EEXIST:
-                raise
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
 
 
 def load_spectral_data(path_or_planet_info):
@@ -94,17 +174,18 @@ def load_spectral_data(path_or_planet_info):
 
     Parameters
     ----------
-    path_or_planet_info : str or list
-        Either a full path to a spectrum, or list of planet parameters in the
-        form [eos code, T, g, Rp, Rs, P, r]. If planet parameters are provided,
-        all possible standard locations will be searched for spectral data.
+    path_or_planet_info : str, list or PlanetParams
+        Either a full path to a spectrum, or PlanetParams, list, tuple or
+        array of planet parameters in the form [eos code, T, g, Rp, Rs, P, r].
+        If planet parameters are provided, all possible standard locations
+        will be searched for spectral data.
 
     Returns
     -------
     spectral_data : ndarray
         The spectrum, which is an array of wavelength and transit depth.
     '''
-    if type(path_or_planet_info) is list or np.ndarray and len(path_or_planet_info) == 7:
+    if isinstance(path_or_planet_info, (list, tuple, np.ndarray, PlanetParams)) and len(path_or_planet_info) == 7:
         planet_info = path_or_planet_info
         # File name without letter code
         base_name = make_file_name(planet_info)
@@ -112,28 +193,154 @@ def load_spectral_data(path_or_planet_info):
         eos_name = eos.get_eos(planet_info[0])
         paths_checked = []
 
-        path = EXOTRANSMIT_SPECTRA_PATH + '/{0}/{1}/{2}'.format(eos_name, int(planet_info[1]), base_name)
+        path = os.path.join(EXOTRANSMIT_SPECTRA_PATH, eos_name, str(int(planet_info[1])), base_name)
 
         paths_checked.append(path)
 
-        if os.path.exists(path):
-            data = np.loadtxt(path, skiprows=3)
-            return data
-
-        raise Exception('Planet data does not exist!\nHave checked at {}'.format(paths_checked))
+        try:
+            return _load_spectrum(path)
+        except FileNotFoundError:
+            raise Exception('Planet data does not exist!\nHave checked at {}'.format(paths_checked))
 
-    elif type(path_or_planet_info) is str or (type(path_or_planet_info) is list or np.ndarray and len(path_or_planet_info) == 1):
+    elif isinstance(path_or_planet_info, str):
         path = path_or_planet_info
-        if os.path.exists(path):
-            data = np.loadtxt(path, skiprows=3)
-            return data
-        else:
+        try:
+            return _load_spectrum(path)
+        except FileNotFoundError:
             raise Exception('Path {} does not exist'.format(path))
 
     else:
         raise Exception('Unable to determine the nature of path_or_planet_info. I was given this: {}'.format(path_or_planet_info))
 
 
+def load_many(paths_or_planet_info, workers=None):
+    '''
+    Loads spectral data for several spectra at once. The files are read in a
+    pool of threads, so that reading one file overlaps with parsing another.
+
+    Parameters
+    ----------
+    paths_or_planet_info : list
+        List where each entry is either a full path to a spectrum, or planet
+        parameters in the form [eos code, T, g, Rp, Rs, P, r], as accepted by
+        load_spectral_data.
+    workers : int, optional
+        Maximum number of threads to use. Default is None, which uses the
+        ThreadPoolExecutor default.
+
+    Returns
+    -------
+    spectral_data : list of ndarray
+        The spectra, in the same order as paths_or_planet_info.
+    '''
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(load_spectral_data, paths_or_planet_info))
+
+
+def _load_spectrum(path):
+    '''
+    Loads a spectrum file, reusing the data from a previous load if the file
+    has not been modified since.
+
+    Parameters
+    ----------
+    path : str
+        Path to the spectrum file
+
+    Returns
+    -------
+    spectral_data : ndarray
+        The spectrum, which is an array of wavelength and transit depth.
+    '''
+    abspath = os.path.abspath(path)
+    stat = os.stat(abspath)
+    data = _load_spectrum_cached(abspath, stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    # Copy so that changes made by the caller don't affect the cached data
+    return data.copy()
+
+
+@lru_cache(maxsize=64)
+def _load_spectrum_cached(abspath, mtime, inode, size):
+    '''
+    Cached read of a spectrum file. mtime, inode and size are only used as
+    part of the cache key, so that modified or replaced files are read again,
+    even within the resolution of the modification time.
+    '''
+    return _read_spectrum(abspath)
+
+
+def _read_spectrum(path):
+    '''
+    Reads the wavelength and transit depth data from a spectrum file, skipping
+    the header.
+
+    Parameters
+    ----------
+    path : str
+        Full path to the spectrum file
+
+    Returns
+    -------
+    spectral_data : ndarray
+        The spectrum, which is an array of wavelength and transit depth.
+    '''
+    with open(path, 'r') as f:
+        for _ in range(_N_HEADER_LINES):
+            f.readline()
+
+        return _read_spectrum_data(f)
+
+
+def _read_spectrum_data(f):
+    '''
+    Reads the wavelength and transit depth data from an open spectrum file
+    which is positioned after the header. The C parser in pandas is used if
+    pandas is installed, as it is much faster than np.loadtxt.
+
+    Parameters
+    ----------
+    f : file
+        Open spectrum file
+
+    Returns
+    -------
+    spectral_data : ndarray
+        The spectrum, which is an array of wavelength and transit depth.
+    '''
+    if pd is not None:
+        return pd.read_csv(f, sep=r'\s+', header=None,
+                           dtype=np.float64).to_numpy()
+
+    return np.loadtxt(f, ndmin=2)
+
+
+def read_spectrum_file(path_to_spectrum_file):
+    '''
+    Reads both the parameters used to generate a spectrum and the spectral
+    data, opening the file only once. Use this instead of calling both
+    get_params_from_file and load_spectral_data on the same file.
+
+    Parameters
+    ----------
+    path_to_spectrum_file : str
+        Full path to the spectrum file.
+
+    Returns
+    -------
+    spectrum_parameters : PlanetParams
+        Parameters used to generate the spectrum, as returned by
+        get_params_from_file
+    spectral_data : ndarray
+        The spectrum, which is an array of wavelength and transit depth.
+    '''
+    with open(path_to_spectrum_file, 'r') as f:
+        header_lines = [f.readline() for _ in range(_N_HEADER_LINES)]
+        spectral_data = _read_spectrum_data(f)
+
+    return PlanetParams(*_parse_params(header_lines[0].strip(), path_to_spectrum_file)), spectral_data
+
+
 def get_params_from_file(path_to_spectrum_file, units=False):
     '''
     Returns the parameters used to generate a spectrum
@@ -148,9 +355,10 @@ def get_params_from_file(path_to_spectrum_file, units=False):
 
     Returns
     -------
-    spectrum_parameters : list
-        Parameters used to generate the spectrum. If units is True, astropy
-        units are attached to the relevant parameters. Listed in order
+    spectrum_parameters : PlanetParams or tuple
+        Parameters used to generate the spectrum. If units is True, a tuple
+        is returned with astropy units attached to the relevant parameters.
+        Listed in order
             EOS (code)
             Temperature (K)
             gravity (m/s2)
@@ -160,73 +368,116 @@ def get_params_from_file(path_to_spectrum_file, units=False):
             rayleigh factor (arbitrary units)
 
     '''
+    params = PlanetParams(*_read_params(path_to_spectrum_file))
 
-    # Find numerical parameters from file
-    with open(path_to_spectrum_file, 'r') as f:
-        txt_line = f.readline().strip()
+    if units:
+        return params.to_quantities()
 
-    params_list = txt_line.split(', ')
-    params_list = [i.split(':') for i in params_list]
+    return params
 
-    params = np.asarray(params_list, dtype=object)
 
-    # Note that this catch is for older spectrum files where the EOS was Not
-    # Included in the header. As of 13/4/18, the EOS is included in the header.
-    if len(params) == 6:
-        params = params[:, 1].astype('float')
-        # Convert to jupiter and solar radii
-        params[2] = params[2] / c.R_jup.value
-        params[3] = params[3] / c.R_sun.value
+def get_params_from_files(paths_to_spectrum_files, units=False):
+    '''
+    Returns the parameters used to generate several spectra, as one array per
+    parameter. This is faster than calling get_params_from_file on each file
+    when units are wanted, as units are attached to whole arrays at once.
 
-        # Find EOS and associated code from the file name
-        fname = os.path.basename(path_to_spectrum_file)
-        eos_string = fname.split('-')[0]
-        eos_code = eos.enumerate_eos(eos_string)
+    Parameters
+    ----------
+    paths_to_spectrum_files : list of str
+        Full paths to spectra to obtain parameters from.
+    units : bool, optional
+        If True, parameters are returned with relevant astropy units attached
+        to them. Default is False
 
-        if units:
-            # add the units
+    Returns
+    -------
+    spectrum_parameters : list of ndarray
+        Parameters used to generate the spectra, with one array per parameter
+        and one entry in each array per file. If units is True, astropy
+        units are attached to the relevant arrays. Listed in order
+            EOS (code)
+            Temperature (K)
+            gravity (m/s2)
+            planet radius (rjup)
+            stellar radius (rsun)
+            cloud top pressure (Pa)
+            rayleigh factor (arbitrary units)
+    '''
+    params = np.array([_read_params(path) for path in paths_to_spectrum_files],
+                      dtype=float).reshape(-1, 7)
 
-            T = params[0] * u.K
-            g = params[1] * u.m * u.s**-2
-            rp = params[2] * u.R_jup
-            rs = params[3] * u.R_sun
-            p = params[4] * u.Pa
-            r = params[5]
+    eos_codes = params[:, 0].astype(int)
+    T, g, rp, rs, p, r = params[:, 1:].T
 
-            params_units = np.array([eos_code, T, g, rp, rs, p, r], dtype=object)
-            return params_units
+    if units:
+        # add the units
+        T = T * u.K
+        g = g * u.m * u.s**-2
+        rp = rp * u.R_jup
+        rs = rs * u.R_sun
+        p = p * u.Pa
 
-        else:
-            params = np.hstack((eos_code, params))
-            return params
+    return [eos_codes, T, g, rp, rs, p, r]
 
-    # Params has been read in as str. Deal with the multiple dtypes here
-    str_params = params[:, 1]
-    float_params = str_params[1:].astype(float).astype(object)
-    params = np.hstack((str_params[0], float_params))
 
-    # Convert to jupiter and solar radii
-    params[3] = params[3] / c.R_jup.value
-    params[4] = params[4] / c.R_sun.value
+def _read_params(path_to_spectrum_file):
+    '''
+    Reads the parameters used to generate a spectrum from the header of the
+    spectrum file.
 
-    # Find EOS and associated code from the file name
-    fname = os.path.basename(path_to_spectrum_file)
-    eos_string = params[0]
-    eos_code = eos.enumerate_eos(eos_string)
+    Parameters
+    ----------
+    path_to_spectrum_file : str
+        Full path to spectrum to obtain parameters from.
 
-    if units:
-        # add the units
+    Returns
+    -------
+    spectrum_parameters : list
+        [EOS code, T, g, planet radius (rjup), stellar radius (rsun), P, r]
+    '''
+    # Find numerical parameters from file
+    with open(path_to_spectrum_file, 'r') as f:
+        txt_line = f.readline().strip()
+
+    return _parse_params(txt_line, path_to_spectrum_file)
+
+
+def _parse_params(txt_line, path_to_spectrum_file):
+    '''
+    Parses the parameters used to generate a spectrum from the first line of
+    the spectrum file.
+
+    Parameters
+    ----------
+    txt_line : str
+        First line of the spectrum file, stripped of whitespace
+    path_to_spectrum_file : str
+        Path to the spectrum file. Used to find the EOS of older spectrum files
+        which do not include it in the header.
 
-        T = params[1] * u.K
-        g = params[2] * u.m * u.s**-2
-        rp = params[3] * u.R_jup
-        rs = params[4] * u.R_sun
-        p = params[5] * u.Pa
-        r = params[6]
+    Returns
+    -------
+    spectrum_parameters : list
+        [EOS code, T, g, planet radius (rjup), stellar radius (rsun), P, r]
+    '''
+    # Header is of the form 'name1:value1, name2:value2, ...'
+    vals = [param.split(':', 1)[1] for param in txt_line.split(', ')]
 
-        params_units = np.array([eos_code, T, g, rp, rs, p, r], dtype=object)
-        return params_units
+    if len(vals) == 7:
+        # The first value is the EOS name, the rest are numbers
+        eos_code = eos.enumerate_eos(vals[0])
+        params = [float(val) for val in vals[1:]]
 
     else:
-        params = np.hstack((eos_code, params[1:]))
-        return params
+        # Older spectrum files did not include the EOS in the header. As of
+        # 13/4/18 it is included, so only these need the file name parsing.
+        fname = os.path.basename(os.fspath(path_to_spectrum_file))
+        eos_code = eos.enumerate_eos(fname.split('-', 1)[0])
+        params = [float(val) for val in vals]
+
+    # Convert to jupiter and solar radii
+    params[2] = params[2] / _R_JUP
+    params[3] = params[3] / _R_SUN
+
+    return [eos_code] + params
@@ -23,8 +23,20 @@ along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 
 from exotransmit import EXOTRANSMIT_INPUT_PATHS
 from exotransmit.io import get_eos
+import os
 import re
 import astropy.constants as c
+from functools import lru_cache
+
+# Jupiter and Solar radii in m
+_R_JUP = float(c.R_jup.value)
+_R_SUN = float(c.R_sun.value)
+
+# Finds the temperature in the name of the T_P file
+_INT_RE = re.compile(r'\d+')
+
+# Lines of userInput.in for each instance of ExoTransmit, read on first use
+_USER_INPUT_TEMPLATES = {}
 
 
 def set_parameters(eos_code, T, g, Rp, Rs, P, r, output_name, n=0):
@@ -41,13 +53,17 @@ def set_parameters(eos_code, T, g, Rp, Rs, P, r, output_name, n=0):
     n : int
         The number of the core to run this simulation on
 
+    Returns
+    -------
+    parameters : tuple
+        The parameters written to userInput.in, in the order returned by
+        get_parameters.
     '''
     Rp = _check_planet_units(Rp)
     Rs = _check_star_units(Rs)
 
-    # Read in userInput
-    with open(EXOTRANSMIT_INPUT_PATHS[n], 'r') as file:
-        userIn = file.readlines()
+    # Start from a copy of userInput, which only needs to be read once
+    userIn = list(_get_user_input_template(n))
 
     # Change relevant lines
     # Set output name
@@ -77,9 +93,40 @@ def set_parameters(eos_code, T, g, Rp, Rs, P, r, output_name, n=0):
     # Set rayleigh scattering factor
     userIn[19] = str(r) + '\n'
 
-    with open(EXOTRANSMIT_INPUT_PATHS[n], 'w') as file:
-        file.writelines(userIn)
-    return 0
+    # Write to a temporary file which then replaces userInput.in, so that a
+    # worker which is stopped part way through never leaves it truncated.
+    path = EXOTRANSMIT_INPUT_PATHS[n]
+    with open(path + '.tmp', 'w') as file:
+        file.write(''.join(userIn))
+    os.replace(path + '.tmp', path)
+
+    # Return what was written, in the form returned by get_parameters, so
+    # that it doesn't need to be read back in.
+    return (userIn[7][:-1], str(int(T)), userIn[9][:-1], userIn[11][:-1],
+            userIn[13][:-1], userIn[15][:-1], userIn[17][:-1], userIn[19][:-1])
+
+
+def _get_user_input_template(n):
+    '''
+    Gets the lines of userInput.in for ExoTransmit(n), reading the file only
+    the first time this is called for n. Only the lines changed by
+    set_parameters differ between runs, so the rest can be reused.
+
+    Parameters
+    ----------
+    n : int
+        The ExoTransmit instance of interest.
+
+    Returns
+    -------
+    userIn : list of str
+        Lines of userInput.in. This should not be modified.
+    '''
+    if n not in _USER_INPUT_TEMPLATES:
+        with open(EXOTRANSMIT_INPUT_PATHS[n], 'r') as file:
+            _USER_INPUT_TEMPLATES[n] = file.readlines()
+
+    return _USER_INPUT_TEMPLATES[n]
 
 
 def get_parameters(n):
@@ -99,11 +146,30 @@ def get_parameters(n):
         [Temperature, Equation of state, output_name, gravity, planet radius,
         stellar radius, Cloud top pressure, rayleigh factor]
     '''
-    with open(EXOTRANSMIT_INPUT_PATHS[n], 'r') as file:
+    path = EXOTRANSMIT_INPUT_PATHS[n]
+    stat = os.stat(path)
+
+    return list(_parse_user_input(path, stat.st_mtime_ns, stat.st_ino, stat.st_size))
+
+
+@lru_cache(maxsize=16)
+def _parse_user_input(path, mtime, inode, size):
+    '''
+    Cached parse of the planet parameters in a userInput.in file. mtime,
+    inode and size are only used as part of the cache key, so that modified
+    files are parsed again, even if rewritten within the resolution of the
+    modification time.
+
+    Returns
+    -------
+    parameters : tuple
+        Parameters in the order returned by get_parameters
+    '''
+    with open(path, 'r') as file:
         userIn = file.readlines()
 
     TP = userIn[5].rstrip('\r\n')
-    TP = re.findall(r'\d+', TP)[0]
+    TP = _INT_RE.search(TP).group(0)
     EOS = userIn[7].rstrip('\r\n')
     output_name = userIn[9].rstrip('\r\n')
     gravity = userIn[11].rstrip('\r\n')
@@ -112,7 +178,7 @@ def get_parameters(n):
     P = userIn[17].rstrip('\r\n')
     r = userIn[19].rstrip('\r\n')
 
-    parameters = [EOS, TP, output_name, gravity, R_p, R_s, P, r]
+    parameters = (EOS, TP, output_name, gravity, R_p, R_s, P, r)
 
     return parameters
 
@@ -140,7 +206,7 @@ def _check_planet_units(Rp):
     '''
     if Rp < 10:
         # Jupiter Radii
-        return Rp * c.R_jup.value
+        return Rp * _R_JUP
     elif 1e6 < Rp < 1e9:
         return Rp
     else:
@@ -170,7 +236,7 @@ def _check_star_units(Rs):
     '''
     if Rs < 100:
         # Jupiter Radii
-        return Rs * c.R_sun.value
+        return Rs * _R_SUN
     elif 1e11 < Rs < 1e12:
         return Rs
     else:
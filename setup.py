@@ -20,41 +20,8 @@ You should have received a copy of the GNU General Public License
 along with ExoTransmitPy.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-from distutils.core import setup
-from setuptools import find_packages
-import os
+from setuptools import setup
 
-# Utility function to read the README file.
-# Used for the long_description.  It's nice, because now 1) we have a top level
-# README file and 2) it's easier to type in the README file than to put a raw
-# string in below ...
-
-
-def read(fname):
-    return open(os.path.join(os.path.dirname(__file__), fname)).read()
-
-
-# Install the Python libraries to machine
-setup(
-    name='exotransmit',
-    version='1.1.0',
-    packages=find_packages(),
-    author='Joshua Hayes',
-    author_email='joshua.hayes@postgrad.manchester.ac.uk',
-    description='Python 3 wrapper for Exo-Transmit (Kempton 2017). Must have Exo-Transmit installed and compiled to known location for this wrapper to work.',
-    long_description=read('README.rst'),
-    package_data={'exotransmit': ['include/*']},
-    include_package_data=True,
-    classifiers=[
-        'Programming Language :: Python :: 3 :: Only',
-        'Intended Audience :: Science/Research',
-        'Development Status :: 3 - Alpha',
-        'Operating System :: OS Independent',
-        'Environment :: Console',
-        'Natural Language :: English',
-        'Topic :: Scientific/Engineering',
-        'Topic :: Scientific/Engineering :: Astronomy',
-        'Topic :: Scientific/Engineering :: Physics',
-        'Topic :: Software Development :: Libraries :: Python Modules'
-    ]
-)
+# All package metadata is in pyproject.toml. This file is kept so that
+# `python setup.py install` still works.
+setup()